@@ -15,19 +15,31 @@ Example
 True
 '''
 
+import functools
 from collections.abc import Iterable
 
 # By default, encountering these types will cause the program to
 # throw an exception as most SQL implementations don't allow for
 # columns with nested data types. By implementing your own decoder,
 # you can override this behavior.
-NESTED = [range, iter, list, dict, tuple, set, frozenset]
+NESTED = frozenset({range, list, dict, tuple, set, frozenset})
 
 # These python types will cause an exception to be thrown if they're
 # encountered without a decoder being given to handle them. This is the
 # case for any python type for which there is no obvious default into
 # corresponding type in SQL.
-UNSUPPORTED = [complex]
+UNSUPPORTED = frozenset({complex})
+
+# Iterable types which are common enough to be matched on their exact type,
+# avoiding the comparatively slow `isinstance(obj, Iterable)` ABC check.
+_ITER_TYPES = frozenset({list, tuple, set, frozenset})
+
+# Lists longer than this are checked for a single element type, in which
+# case the hook is resolved once for the whole list.
+_HOMOGENEOUS_MIN_LEN = 64
+
+# Distinguishes a type without a hook from one whose hook is None.
+_MISSING = object()
 
 class PostgresTypeEncoder:
     '''
@@ -36,6 +48,9 @@ class PostgresTypeEncoder:
     PostgresTypeEncoder encodes Python objects into the corresponding
     types in SQL with the aim of allowing for dynamic SQL queries that
     require type information.
+
+    Hooks are matched against the exact type of each object, so a
+    subclass of a hooked type needs a hook of its own.
     '''
 
     def __init__(self, hooks={}):
@@ -59,9 +74,12 @@ class PostgresTypeEncoder:
             **hooks,
         }
 
-    def _resolve_hook(self, pytype):
-        resolver = self.hooks[pytype]
+        # Split the hooks by kind so that the per-element encoding loops
+        # can skip the type checks made by `_resolve_hook`.
+        self._str_hooks = {k: v for k, v in self.hooks.items() if type(v) is str}
+        self._call_hooks = {k: v for k, v in self.hooks.items() if callable(v)}
 
+    def _resolve_hook(self, pytype, resolver):
         if isinstance(resolver, str):
             return resolver
 
@@ -75,40 +93,76 @@ class PostgresTypeEncoder:
             '''.format(pytype)
         )
 
-    def _validate_object_types(self, obj):
-        types = [type(item) for item in obj]
-
-        for pytype in types:
-            if pytype not in self.hooks:
-                raise TypeError('SQL does not have a type corresponding to {}.'.format(pytype))
-
-            if pytype in NESTED:
-                raise TypeError(
-                    '''
-                    The type '{}' is nested. Nested types aren't valid in PostgreSQL.
-                    You should either flatten the corresponding object of that type
-                    into it's container object, or write a decoder to do so dynamically.
-                    '''.format(pytype)
-                )
-
-            if pytype in UNSUPPORTED:
-                raise TypeError(
-                    '''
-                    The object of type '{}' has no default corresponding type within PostgerSQL.
-                    You can resolve this by either removing the object, aliasing it to an
-                    PostgreSQL type, or writing a decoder.
-                    '''.format(pytype)
-                )
-
-        return types
+    def _validate_one(self, pytype):
+        if pytype in self.hooks:
+            return
+
+        if pytype in NESTED:
+            raise TypeError(
+                '''
+                The type '{}' is nested. Nested types aren't valid in PostgreSQL.
+                You should either flatten the corresponding object of that type
+                into it's container object, or write a decoder to do so dynamically.
+                '''.format(pytype)
+            )
+
+        if pytype in UNSUPPORTED:
+            raise TypeError(
+                '''
+                The object of type '{}' has no default corresponding type within PostgerSQL.
+                You can resolve this by either removing the object, aliasing it to an
+                PostgreSQL type, or writing a decoder.
+                '''.format(pytype)
+            )
+
+        raise TypeError('SQL does not have a type corresponding to {}.'.format(pytype))
+
+    def _encode_one(self, pytype):
+        resolver = self._str_hooks.get(pytype)
+
+        if resolver is not None:
+            return resolver
+
+        resolver = self._call_hooks.get(pytype)
+
+        if resolver is not None:
+            return resolver(pytype)
+
+        self._validate_one(pytype)
+        return self._resolve_hook(pytype, self.hooks[pytype])
 
     def _iter_to_sql_types(self, obj):
-        types = self._validate_object_types(obj)
-        return [self._resolve_hook(t) for t in types]
+        if type(obj) is list and len(obj) > _HOMOGENEOUS_MIN_LEN:
+            pytype = type(obj[0])
+            resolver = self._str_hooks.get(pytype)
+
+            if resolver is not None and all(type(item) is pytype for item in obj):
+                return [resolver] * len(obj)
+
+        encode_one = self._encode_one
+        return [encode_one(type(item)) for item in obj]
 
     def _dict_to_sql_columns(self, obj):
-        types = self._validate_object_types(obj.values())
-        return {k: self._resolve_hook(t) for k, t in zip(obj.keys(), types)}
+        str_hooks = self._str_hooks
+        call_hooks = self._call_hooks
+        columns = {}
+
+        for name, value in obj.items():
+            pytype = type(value)
+            sqltype = str_hooks.get(pytype)
+
+            if sqltype is None:
+                resolver = call_hooks.get(pytype)
+
+                if resolver is not None:
+                    sqltype = resolver(pytype)
+                else:
+                    self._validate_one(pytype)
+                    sqltype = self._resolve_hook(pytype, self.hooks[pytype])
+
+            columns[name] = sqltype
+
+        return columns
 
     def encode(self, obj):
         '''
@@ -126,13 +180,20 @@ class PostgresTypeEncoder:
         {'is_admin': 'boolean'}
         '''
         obj_t = type(obj)
+        resolver = self.hooks.get(obj_t, _MISSING)
 
-        if obj_t in self.hooks:
-            return self._resolve_hook(obj_t)
+        if isinstance(resolver, str):
+            return resolver
+
+        if resolver is not _MISSING:
+            return self._resolve_hook(obj_t, resolver)
 
         if obj_t is dict:
             return self._dict_to_sql_columns(obj)
 
+        if obj_t in _ITER_TYPES:
+            return self._iter_to_sql_types(obj)
+
         if isinstance(obj, Iterable):
             return self._iter_to_sql_types(obj)
 
@@ -143,6 +204,28 @@ class PostgresTypeEncoder:
             '''
         )
 
+_DEFAULT_ENCODER = PostgresTypeEncoder()
+
+@functools.lru_cache(maxsize=32)
+def _cached_encoder(hook_items):
+    return PostgresTypeEncoder(dict(hook_items))
+
+def _get_encoder(hooks):
+    if hooks is None or (type(hooks) is dict and not hooks):
+        return _DEFAULT_ENCODER
+
+    if type(hooks) is not dict:
+        # Let the encoder reject anything other than a dictionary.
+        return PostgresTypeEncoder(hooks)
+
+    try:
+        hook_items = frozenset(hooks.items())
+    except TypeError:
+        # Unhashable hooks can't be cached.
+        return PostgresTypeEncoder(hooks)
+
+    return _cached_encoder(hook_items)
+
 def dumps(obj, hooks={}):
     '''
     Description
@@ -171,9 +254,19 @@ def dumps(obj, hooks={}):
 
     >>> py2pg.dumps("test")
     'text'
+
+    Nested values are rejected unless a hook is given for their type:
+
+    >>> py2pg.dumps({ "tags": ["a", "b"] }) # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    TypeError: ...The type '<class 'list'>' is nested...
+
+    >>> py2pg.dumps({ "tags": ["a", "b"] }, hooks={ list: 'text[]' })
+    {'tags': 'text[]'}
     '''
 
-    return PostgresTypeEncoder(hooks).encode(obj)
+    return _get_encoder(hooks).encode(obj)
 
 if __name__ == "__main__":
     import doctest
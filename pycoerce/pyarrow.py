@@ -22,6 +22,18 @@ value: int64
 import collections
 import pyarrow as pa
 
+# Module-level aliases for the pyarrow constructors used while encoding,
+# saving an attribute lookup on the pyarrow module for every call.
+_pa_list = pa.list_
+_pa_struct = pa.struct
+_pa_schema = pa.schema
+_pa_array = pa.array
+_pa_record_batch_from_arrays = pa.RecordBatch.from_arrays
+_pa_table_from_batches = pa.Table.from_batches
+
+# The number of struct types a PyarrowTypeEncoder keeps cached.
+_STRUCT_CACHE_SIZE = 128
+
 # Fixes: https://issues.apache.org/jira/browse/ARROW-3080?src=confmacro
 def order_by_key(obj):
     '''
@@ -29,7 +41,31 @@ def order_by_key(obj):
     -----------
     Order a python dictionary by the value of it's keys
     '''
-    return dict(collections.OrderedDict(sorted(obj.items())))
+    return dict(sorted(obj.items()))
+
+def _same_type_ignoring_field_order(inferred, expected):
+    if inferred == expected:
+        return True
+
+    if pa.types.is_struct(inferred) and pa.types.is_struct(expected):
+        if inferred.num_fields != expected.num_fields:
+            return False
+
+        for field in expected:
+            index = inferred.get_field_index(field.name)
+
+            if index == -1:
+                return False
+
+            if not _same_type_ignoring_field_order(inferred[index].type, field.type):
+                return False
+
+        return True
+
+    if pa.types.is_list(inferred) and pa.types.is_list(expected):
+        return _same_type_ignoring_field_order(inferred.value_type, expected.value_type)
+
+    return False
 
 class PyarrowTypeEncoder:
     '''
@@ -37,6 +73,9 @@ class PyarrowTypeEncoder:
     -----------
     Convert from python types to pyarrow types.
 
+    Hooks are matched against the exact type of each object, so a
+    subclass of a hooked type needs a hook of its own.
+
     Example
     -------
     >>> import pycoerce.pyarrow as py2pa
@@ -55,46 +94,71 @@ class PyarrowTypeEncoder:
             **hooks
         }
 
+        # Struct types of flat dictionaries, keyed by their sorted keys and
+        # the types of the corresponding values, in least recently used order.
+        self._struct_cache = collections.OrderedDict()
+
+        self._dispatch = {
+            list: self._encode_list,
+            dict: self._encode_dict,
+        }
+
+    def _encode_list(self, obj):
+        # Descend through directly nested lists without recursing, then wrap
+        # the element type once for each level that was passed.
+        depth = 0
+
+        while type(obj) is list:
+            if not obj:
+                raise TypeError("PyArrow's 'list_' type does not support empty lists.")
+
+            obj = obj[0]
+            depth += 1
+
+        pyarrow_type = self._pytype_to_pyarrow_type(obj)
+
+        for _ in range(depth):
+            pyarrow_type = _pa_list(pyarrow_type)
+
+        return pyarrow_type
+
+    def _encode_dict(self, obj):
+        # The keys are sorted so that the struct's field order is deterministic,
+        # rather than depending on the insertion order of whichever dictionary
+        # happens to be encoded (for tables, the one in the first row). Dicts
+        # sharing keys but not key order thus encode to the same struct type.
+        items = sorted(obj.items())
+        dispatch = self._dispatch
+
+        # Lists and dictionaries can't be cached by their type alone, as their
+        # pyarrow type depends on their contents.
+        if any(type(v) in dispatch for _, v in items):
+            return _pa_struct([(k, self._pytype_to_pyarrow_type(v)) for k, v in items])
+
+        cache = self._struct_cache
+        signature = tuple((k, type(v)) for k, v in items)
+        # Popping and reinserting a hit marks it as most recently used without
+        # a separate lookup that another thread's eviction could invalidate.
+        struct = cache.pop(signature, None)
+
+        if struct is not None:
+            cache[signature] = struct
+            return struct
+
+        struct = _pa_struct([(k, self._pytype_to_pyarrow_type(v)) for k, v in items])
+        cache[signature] = struct
+
+        if len(cache) > _STRUCT_CACHE_SIZE:
+            cache.popitem(last=False)
+
+        return struct
+
     def _pytype_to_pyarrow_type(self, obj):
         pytype = type(obj)
+        handler = self._dispatch.get(pytype)
 
-        if pytype is list:
-            if obj:
-                return pa.list_(self._pytype_to_pyarrow_type(obj[0]))
-
-            raise TypeError("PyArrow's 'list_' type does not support empty lists.")
-
-        if pytype is dict:
-            # Pyarrow, currently, does not correctly handle the management of
-            # complexly typed parquet structures. In particular, if the line
-            # below this comment is removed, line 70 of this file fails in the
-            # manner illustrated below:
-            #
-            # >>> impport pycoerce.pyarrow as py2pa
-            # >>> encoder = py2pa.PyarrowTableEncoder()
-            # >>> encoder.encode([{ 'foo': { 'bar': {}, 'bac': {}, 'foo': 1 } }])
-            # 	Traceback (most recent call last):
-            # 	File "pyarrow.py", line 103, in _list_of_dicts_to_pyarrow_table
-            #	File "pyarrow/table.pxi", line 1251, in pyarrow.lib.Table.from_batches
-            # 	File "pyarrow/error.pxi", line 81, in pyarrow.lib.check_status
-            # 	pyarrow.lib.ArrowInvalid: Schema at index 0 was different:
-            # 	foo: struct<bar: struct<>, bac: struct<>, foo: int64>
-            #	vs
-            #	foo: struct<bac: struct<>, bar: struct<>, foo: int64>
-            #
-            # But, as shown be the following two examples, the above error only arises due to the
-            # ordering of the keys to the nested dictionaries:
-            #
-            # >>> encoder.encode([{ 'foo': { 'bac': {}, 'bar': {}, 'foo': 1 } }])
-            # >>> encoder.encode([{ 'foo': { 'bar': {}, 'bac': {} } }])
-            #
-            # The solution is thus to order those dictionaries, bykey, which is done
-            # below:
-            obj = order_by_key(obj)
-
-            types = [self._pytype_to_pyarrow_type(v) for v in obj.values()]
-            fields = [(k, v) for k, v in zip(obj.keys(), types)]
-            return pa.struct(fields)
+        if handler is not None:
+            return handler(obj)
 
         return self.hooks[pytype]()
 
@@ -137,20 +201,48 @@ class PyarrowTableEncoder:
         if not objects:
             return pa.Table.from_arrays([], [])
 
-        objects = [order_by_key(obj) for obj in objects]
+        # Every row shares the schema of the first, so its keys are sorted once
+        # and the same column order is used to read the remaining rows. Keys
+        # which only appear in later rows are dropped, whereas rows missing
+        # any of the first row's keys are rejected.
+        columns = sorted(objects[0].keys())
+
+        try:
+            values = [[obj[column] for obj in objects] for column in columns]
+        except KeyError as error:
+            column = error.args[0]
+            index = next(i for i, obj in enumerate(objects) if column not in obj)
+
+            raise pa.ArrowInvalid(
+                "Row {} is missing column '{}', which is present in the first row."
+                .format(index, column)
+            ) from None
 
-        columns = list(objects[0].keys())
-        values = [list(dict.values()) for dict in objects]
-        rows = [pa.array(row) for row in zip(*values)]
+        field_types = [self.type_encoder.encode(objects[0][column]) for column in columns]
 
-        fields = [
-            pa.field(column, self.type_encoder.encode(values[0][i]))
-            for i, column in enumerate(columns)
-        ]
-        schema = pa.schema(fields)
+        rows = []
 
-        batch = pa.RecordBatch.from_arrays(rows, columns)
-        table = pa.Table.from_batches([batch], schema)
+        for column, column_values, field_type in zip(columns, values, field_types):
+            row = _pa_array(column_values)
+
+            # Pyarrow infers nested struct fields in the order of the first
+            # dictionary's keys, whereas the encoded type has them sorted. Any
+            # other difference means the rows don't share a schema.
+            if row.type != field_type:
+                if not _same_type_ignoring_field_order(row.type, field_type):
+                    raise pa.ArrowInvalid(
+                        "Column '{}' encodes as {} but pyarrow infers {}."
+                        .format(column, field_type, row.type)
+                    )
+
+                row = _pa_array(column_values, type=field_type)
+
+            rows.append(row)
+
+        schema = _pa_schema(list(zip(columns, field_types)))
+
+        batch = _pa_record_batch_from_arrays(rows, columns)
+        table = _pa_table_from_batches([batch], schema)
 
         return table
 
@@ -167,6 +259,20 @@ class PyarrowTableEncoder:
         >>> encoder.encode([{ "foo": 1 }])
         pyarrow.Table
         foo: int64
+
+        Nested dictionaries needn't have their keys in order:
+
+        >>> encoder.encode([{ "foo": { "bar": 1, "bac": 2 } }]).schema
+        foo: struct<bac: int64, bar: int64>
+          child 0, bac: int64
+          child 1, bar: int64
+
+        But every row must have the same types:
+
+        >>> encoder.encode([{ "a": 1 }, { "a": 2.9 }])
+        Traceback (most recent call last):
+        ...
+        pyarrow.lib.ArrowInvalid: Column 'a' encodes as int64 but pyarrow infers double.
         '''
         return self._list_of_dicts_to_pyarrow_table(objs)
 